@@ -5,11 +5,30 @@ from agno.playground import Playground
 from agno.storage.sqlite import SqliteStorage
 from agno.playground import Playground
 from fastapi.middleware.cors import CORSMiddleware
-from ui_tools import process_case, process_uploaded_file
+from ui_tools import (
+    STAGE_DIR,
+    process_case,
+    process_uploaded_file,
+    process_staged_file,
+    process_zip_stream,
+    process_rar_stream,
+)
+import shutil
+import tempfile
+from pathlib import Path
+import asyncio
 import base64
-from fastapi import UploadFile, File, HTTPException
+from fastapi import UploadFile, File, HTTPException, Body
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
+from functools import lru_cache
 import json
-from l4_reversal_orchestrator import reporter
+from l4_reversal_orchestrator import (
+    reporter,
+    notify_webhook_async,
+    aclose_webhook_client,
+    WEBHOOK_URL,
+)
 from agno.tools import tool
 
 
@@ -29,7 +48,7 @@ def recall_last_result() -> dict:
 reversal_agent = Agent(
     name="Reversal Agent",
     model=Gemini(id=os.getenv("MODEL_ID", "gemini-1.5-flash")),
-    tools=[process_case, process_uploaded_file, remember_last_result, recall_last_result],
+    tools=[process_case, process_uploaded_file, process_staged_file, remember_last_result, recall_last_result],
     instructions=[
         "You evaluate reversal eligibility from uploaded JSON/XML/CSV files.",
         "If a user uploads a file, call `process_uploaded_file(filename, content_b64)`.",
@@ -47,6 +66,9 @@ reversal_agent = Agent(
 
 playground = Playground(agents=[reversal_agent])
 app = playground.get_app()
+# Routes registered below serialize their dict responses through orjson
+# instead of stdlib json (matters for large batch summaries).
+app.router.default_response_class = ORJSONResponse
 
 def summarize_result(raw: dict) -> str:
     """
@@ -99,16 +121,51 @@ def summarize_result(raw: dict) -> str:
         return f"Reversal {verdict} {mode_txt}. {amt_txt}{notes_txt}"
     except Exception:
         return "Processed the file. (Could not build a summary.)"
+# Clients POST raw bytes here once and hand the returned path to
+# process_staged_file; STAGE_DIR lives in ui_tools so the tool only
+# accepts paths inside it.
+@app.post("/api/stage")
+async def stage(file: UploadFile = File(...)):
+    suffix = Path(file.filename or "upload.json").suffix.lower() or ".json"
+    fd, stage_path = tempfile.mkstemp(dir=STAGE_DIR, suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, out)
+    except Exception as e:
+        try:
+            os.remove(stage_path)
+        except OSError:
+            pass
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "stage_path": stage_path}
+
 @app.post("/upload")
 async def upload(file: UploadFile = File(...)):
     try:
-        content = await file.read()
-        b64 = base64.b64encode(content).decode("utf-8")
+        suffix = Path(file.filename or "").suffix.lower()
+        if suffix in (".zip", ".rar"):
+            # UploadFile.file is already a seekable SpooledTemporaryFile;
+            # hand it straight to the archive pipeline — no whole-payload
+            # bytes object and no base64 round-trip.
+            handler = process_zip_stream if suffix == ".zip" else process_rar_stream
+            raw = await asyncio.to_thread(handler, file.file)
+        else:
+            content = await file.read()
+            b64 = base64.b64encode(content).decode("utf-8")
 
-        raw = process_uploaded_file.entrypoint(
-            filename=file.filename,
-            content_b64=b64
-        )
+            # The deterministic pipeline is synchronous (file I/O, SQLite,
+            # possibly a whole archive batch); run it on a worker thread so
+            # the event loop keeps serving other requests meanwhile.
+            # notify=False: the webhook is awaited below on the event loop
+            # instead of going through the blocking path inside the tool.
+            raw = await asyncio.to_thread(
+                process_uploaded_file.entrypoint,
+                filename=file.filename,
+                content_b64=b64,
+                notify=False,
+            )
+        if "decision" in raw:
+            await notify_webhook_async(raw["decision"], raw["ops"], WEBHOOK_URL)
         summary_text = summarize_result(raw)
         try:
             remember_last_result.entrypoint(result=raw)
@@ -118,9 +175,45 @@ async def upload(file: UploadFile = File(...)):
         return {"ok": True, "summary": summary_text}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
+
+@app.post("/api/summarize")
+async def summarize(result: dict = Body(...)):
+    """Stream an LLM summary of a pipeline result.
+
+    Kept separate from /upload so processing isn't held hostage to
+    seconds of LLM latency; callers opt in and get tokens as they are
+    generated instead of waiting for the full completion.
+    """
+    # Serialize once with orjson; the bytes are reused for the prompt.
+    final_json = orjson.dumps(result).decode()
+
+    def _chunks():
+        for event in reporter.run(f"Summarize for a product manager:\n{final_json}", stream=True):
+            content = getattr(event, "content", None)
+            if content:
+                yield content
+
+    return StreamingResponse(_chunks(), media_type="text/plain")
+
+@app.on_event("shutdown")
+async def _close_webhook_client():
+    await aclose_webhook_client()
+
+
+class CachedCORSMiddleware(CORSMiddleware):
+    """CORSMiddleware that memoizes origin checks.
+
+    The LAN alternation regex below backtracks on every request in stock
+    Starlette; browsers only ever send a handful of distinct Origin
+    headers, so each one is matched once and the verdict is cached.
+    """
+
+    @lru_cache(maxsize=1024)
+    def is_allowed_origin(self, origin: str) -> bool:
+        return super().is_allowed_origin(origin)
+
 app.add_middleware(
-    CORSMiddleware,
+    CachedCORSMiddleware,
     allow_origin_regex=r"^https?://(localhost|127\.0\.0\.1|0\.0\.0\.0|"
                        r"192\.168\.\d{1,3}\.\d{1,3}|"
                        r"10\.\d{1,3}\.\d{1,3}\.\d{1,3}|"
@@ -1,92 +1,255 @@
 # ui_tools.py
-import os, json, tempfile
+import atexit
+import base64, os, shutil, tempfile, zipfile
+from uuid import uuid4
 from pathlib import Path
-from l4_reversal_orchestrator import run_pipeline_batch
+
 from agno.tools import tool
-import rarfile
-import base64, tempfile, zipfile, os, json
-from pathlib import Path
+
 from l4_reversal_orchestrator import (
-    load_case_impl,
-    resolve_rules_impl,
-    validate_case_impl,
-    evaluate_eligibility_impl,
-    ledger_plan_impl,
-    audit_write_impl,
-    notify_webhook_impl,
-    DB_PATH,
-    WEBHOOK_URL,
+    load_case_from_stream,
+    run_pipeline_batch,
+    run_process_case,
+    run_process_case_from_path,
+    sniff_case_suffix,
 )
 
-def _run_process_case_from_path(path: str) -> dict:
-    case = load_case_impl(path)
-    rules = resolve_rules_impl(case, "config/rules.yaml", "rules")
-    validity = validate_case_impl(case)
-    if validity.startswith("invalid:"):
-        raise ValueError(validity)
+# Optional: only the RAR branch needs it, and the binary backend may be
+# absent anyway — fail at use, not at import.
+try:
+    import rarfile
+except ImportError:
+    rarfile = None
+
+# Multiple of 4 so each input slice decodes independently (base64 maps
+# 4 chars -> 3 bytes with no state across aligned boundaries).
+_B64_CHUNK = 64 * 1024
+
+def _b64_decode_to_file(content_b64: str, fh) -> None:
+    """Decode base64 text straight into a file handle, chunk by chunk.
+
+    Peak memory stays O(chunk) instead of holding the full decoded
+    payload next to the b64 string.
+    """
+    # Line-wrapped (MIME-style) base64 would break the 4-char alignment
+    # the fixed-size chunks rely on; b64decode skips whitespace itself,
+    # but only within one call, so normalize before slicing.
+    content_b64 = "".join(content_b64.split())
+    for i in range(0, len(content_b64), _B64_CHUNK):
+        fh.write(base64.b64decode(content_b64[i:i + _B64_CHUNK]))
+
+def _drop_page_cache(fd: int) -> None:
+    """Hint the kernel to evict a temp file's pages; best-effort.
+
+    Deleting a temp file only drops the dentry — the data pages linger in
+    the page cache and crowd out hotter data. POSIX_FADV_DONTNEED releases
+    them eagerly. No-op where unsupported.
+    """
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except (AttributeError, OSError):
+        pass
+
+def _drop_tree_page_cache(root: str) -> None:
+    """Evict every file under `root` from the page cache (best-effort)."""
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                fd = os.open(os.path.join(dirpath, name), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                _drop_page_cache(fd)
+            finally:
+                os.close(fd)
+
+# One persistent scratch root per process: each archive gets a cheap
+# uuid-named subdir (one mkdir) instead of a full TemporaryDirectory
+# lifecycle per request, and the root is swept once at exit.
+SCRATCH = Path(tempfile.mkdtemp(prefix="reversal_"))
+atexit.register(shutil.rmtree, SCRATCH, ignore_errors=True)
+
+def _scratch_subdir() -> Path:
+    d = SCRATCH / uuid4().hex
+    d.mkdir()
+    return d
+
+# Staging area for path-based uploads: /api/stage streams the raw bytes
+# here once and hands the returned path to process_staged_file, skipping
+# the ~33% base64 inflation and the O(N) decode of the content_b64 route.
+# Lives here (not in the web layer) so the tool can confine the paths it
+# will touch to this directory.
+STAGE_DIR = Path(tempfile.gettempdir()) / "reversal_stage"
+STAGE_DIR.mkdir(exist_ok=True)
+
+# Extraction limits: a kilobyte-sized bomb can expand to disk-full and
+# starve every other request, so bail before extracting anything.
+MAX_ARCHIVE_UNCOMPRESSED = 1 << 30   # 1 GiB
+MAX_ARCHIVE_ENTRIES = 10_000
+
+def _check_archive(infos, tmpdir: str) -> None:
+    """Validate archive members before extraction.
+
+    Rejects archives with too many entries, an uncompressed total over
+    the limit, or members whose normalized path escapes the extraction
+    directory (zip-slip). Works for both ZipInfo and RarInfo lists.
+    """
+    if len(infos) > MAX_ARCHIVE_ENTRIES:
+        raise ValueError(
+            f"Archive has {len(infos)} entries (limit {MAX_ARCHIVE_ENTRIES})."
+        )
+    total = sum(i.file_size for i in infos)
+    if total > MAX_ARCHIVE_UNCOMPRESSED:
+        raise ValueError(
+            f"Archive expands to {total} bytes (limit {MAX_ARCHIVE_UNCOMPRESSED})."
+        )
+    root = os.path.realpath(tmpdir)
+    for i in infos:
+        target = os.path.realpath(os.path.join(root, i.filename))
+        if target != root and not target.startswith(root + os.sep):
+            raise ValueError(f"Archive entry escapes extraction dir: {i.filename!r}")
+
+def _run_batch_from_archive(source, suffix: str) -> dict:
+    """Extract an archive and run the batch pipeline on its contents.
 
-    decision = evaluate_eligibility_impl(case, rules)
-    ops = ledger_plan_impl(decision)
+    `source` is a seekable binary stream for ".zip" (ZipFile doesn't need
+    a path) or an on-disk path for ".rar" (the unrar backend does).
+    """
+    tmpdir = str(_scratch_subdir())
+    try:
+        if suffix == ".zip":
+            with zipfile.ZipFile(source) as zf:
+                infos = zf.infolist()
+                _check_archive(infos, tmpdir)
+
+                # Feed entries to the batch as they are decompressed, so
+                # extraction of later entries overlaps with processing of
+                # earlier ones instead of running strictly before it.
+                def _extracted():
+                    for info in infos:
+                        if info.is_dir():
+                            continue
+                        if info.filename.rsplit(".", 1)[-1].lower() not in ("json", "xml", "csv"):
+                            continue
+                        yield zf.extract(info, tmpdir)
+
+                summary = run_pipeline_batch(tmpdir, out_dir="out", case_paths=_extracted())
+                _drop_tree_page_cache(tmpdir)
+                return {"batch_summary": summary}
+
+        # RAR extraction shells out to unrar, so one extractall call beats
+        # a subprocess per member; no overlap on this branch.
+        if rarfile is None:
+            raise RuntimeError("RAR support requires the 'rarfile' package (pip install rarfile).")
+        try:
+            with rarfile.RarFile(source) as rf:
+                _check_archive(rf.infolist(), tmpdir)
+                rf.extractall(tmpdir)
+        except rarfile.RarCannotExec:
+            raise RuntimeError(
+                "RAR support requires the 'unrar' binary installed and available on PATH."
+            )
+        except rarfile.BadRarFile as e:
+            raise RuntimeError(f"Invalid RAR file: {e}")
+
+        summary = run_pipeline_batch(tmpdir, out_dir="out")
+        _drop_tree_page_cache(tmpdir)
+        return {"batch_summary": summary}
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+def process_zip_stream(fp) -> dict:
+    """Run the batch pipeline straight off a seekable ZIP stream.
+
+    Lets the web layer pass UploadFile.file (a SpooledTemporaryFile)
+    without reading the payload into bytes or round-tripping base64.
+    """
+    return _run_batch_from_archive(fp, ".zip")
+
+def process_rar_stream(fp) -> dict:
+    """Run the batch pipeline off a RAR stream via one on-disk copy.
 
-    # side effects same as CLI
-    audit_write_impl(decision, ops, DB_PATH)
-    notify_webhook_impl(decision, ops, WEBHOOK_URL)
-    return {"decision": decision, "ops": ops}
+    unrar needs a real path, so the stream is copied once with
+    copyfileobj — still no whole-payload bytes object in Python.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".rar") as tmp:
+        shutil.copyfileobj(fp, tmp)
+        tmp.flush()
+        result = _run_batch_from_archive(tmp.name, ".rar")
+        _drop_page_cache(tmp.fileno())
+        return result
 
 @tool(show_result=True, stop_after_tool_call=True)
 def process_case(path: str) -> dict:
     """Deterministic pipeline for a single file already on disk."""
-    return _run_process_case_from_path(path)
+    return run_process_case_from_path(path)
 
 
 @tool(show_result=True, stop_after_tool_call=True)
-def process_uploaded_file(filename: str, content_b64: str) -> dict:
-    import base64, tempfile, zipfile, os, json
-    from pathlib import Path
+def process_staged_file(stage_path: str, notify: bool = True) -> dict:
+    """Process a file staged on this server via /api/stage.
 
-    # ⬇️ NEW: import rarfile
-    import rarfile
+    The web layer streams the upload bytes to disk once and passes only
+    the path, so there is no base64 inflation or decode on the way in.
+    The staged file is consumed (deleted) after processing.
 
-    suffix = Path(filename).suffix.lower() or ".json"
-    tmp_path = None
+    Only paths inside STAGE_DIR are accepted: this tool is exposed to the
+    LLM agent, and an arbitrary stage_path would let a confused tool call
+    read — and then delete — any file the server can see.
+    """
+    p = Path(stage_path).resolve()
+    if not p.is_relative_to(STAGE_DIR.resolve()):
+        raise ValueError(f"stage_path must point inside the staging dir {STAGE_DIR}")
     try:
-        data = base64.b64decode(content_b64)
-
-        # ZIP/RAR => unpack and run batch on the extracted folder
-        if suffix in (".zip", ".rar"):
-            with tempfile.TemporaryDirectory() as tmpdir:
-                if suffix == ".zip":
-                    zippath = Path(tmpdir) / "upload.zip"
-                    zippath.write_bytes(data)
-                    with zipfile.ZipFile(zippath, "r") as zf:
-                        zf.extractall(tmpdir)
-                else:
-                    rarpath = Path(tmpdir) / "upload.rar"
-                    rarpath.write_bytes(data)
-                    try:
-                        with rarfile.RarFile(rarpath) as rf:
-                            rf.extractall(tmpdir)
-                    except rarfile.RarCannotExec:
-                        raise RuntimeError(
-                            "RAR support requires the 'unrar' binary installed and available on PATH."
-                        )
-                    except rarfile.BadRarFile as e:
-                        raise RuntimeError(f"Invalid RAR file: {e}")
-
-                # run your existing batch pipeline on the extracted folder
-                from l4_reversal_orchestrator import run_pipeline_batch
-                summary = run_pipeline_batch(tmpdir, out_dir="out")
-                return {"batch_summary": summary}
+        suffix = p.suffix.lower() or ".json"
+        if suffix == ".zip":
+            with p.open("rb") as fh:
+                return _run_batch_from_archive(fh, ".zip")
+        if suffix == ".rar":
+            return _run_batch_from_archive(str(p), ".rar")
+        return run_process_case_from_path(str(p), notify=notify)
+    finally:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
 
-        # Single-file path (json/xml/csv) -> deterministic pipeline
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp.write(data)
-            tmp_path = tmp.name
-        return _run_process_case_from_path(tmp_path)
 
-    finally:
-        if tmp_path and Path(tmp_path).exists():
-            try:
-                os.remove(tmp_path)
-            except Exception:
-                pass
\ No newline at end of file
+@tool(show_result=True, stop_after_tool_call=True)
+def process_uploaded_file(filename: str, content_b64: str, notify: bool = True) -> dict:
+    suffix = Path(filename).suffix.lower() or ".json"
+    # ZIP/RAR => unpack and run batch on the extracted folder
+    if suffix == ".zip":
+        # ZipFile only needs a seekable stream, so decode into a spooled
+        # temp file instead of an upload.zip on disk: small archives never
+        # touch the filesystem, large ones skip the extra write+read of
+        # the compressed bytes.
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+            _b64_decode_to_file(content_b64, spool)
+            spool.seek(0)
+            return _run_batch_from_archive(spool, ".zip")
+
+    if suffix == ".rar":
+        # The unrar backend wants a real path, so the decoded archive
+        # goes to a named temp file for the duration of the extraction.
+        with tempfile.NamedTemporaryFile(suffix=".rar") as tmp:
+            _b64_decode_to_file(content_b64, tmp)
+            tmp.flush()
+            result = _run_batch_from_archive(tmp.name, ".rar")
+            _drop_page_cache(tmp.fileno())
+            return result
+
+    # Single-file path (json/xml/csv) -> deterministic pipeline.
+    # The common case is a ~2 KB JSON body: the spool keeps it in RAM
+    # (spilling to an anonymous temp file past 1 MiB) and
+    # load_case_from_stream parses it in place — no named temp file to
+    # write, re-read, and unlink.
+    with tempfile.SpooledTemporaryFile(max_size=1 << 20) as spool:
+        _b64_decode_to_file(content_b64, spool)
+        spool.seek(0)
+        if suffix not in (".json", ".xml", ".csv"):
+            # Pasted bodies arrive under a made-up filename; peek at the
+            # first non-whitespace byte instead of trusting the extension.
+            suffix = sniff_case_suffix(spool)
+        case = load_case_from_stream(spool, suffix)
+    return run_process_case(case, notify=notify)
\ No newline at end of file